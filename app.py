@@ -1,35 +1,66 @@
 import os
 import json
 import io
+import hashlib
+import importlib.util
+import itertools
+import logging
+import re
+import textwrap
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
-from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from dataclasses import asdict, dataclass, replace
+from typing import TYPE_CHECKING, Iterator, List, Optional, Dict, Any, Tuple
+from uuid import uuid4
 
-import pandas as pd
+import numpy as np
 import streamlit as st
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.units import cm
 
-    PDF_AVAILABLE = True
+try:
+    import orjson
 except Exception:
-    PDF_AVAILABLE = False
+    orjson = None
 
-try:
-    from openai import OpenAI
 
+# pandas, reportlab and openai are imported on first use to keep cold starts fast.
+@st.cache_resource(show_spinner=False)
+def get_openai_client() -> Optional[Any]:
     api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key) if api_key else None
-    OPENAI_AVAILABLE = client is not None
-except Exception:
-    client = None
-    OPENAI_AVAILABLE = False
+    if not api_key:
+        return None
+    try:
+        from openai import OpenAI
+
+        return OpenAI(api_key=api_key)
+    except Exception:
+        return None
+
 
+PDF_AVAILABLE = importlib.util.find_spec("reportlab") is not None
 
-@dataclass
+
+@st.cache_resource(show_spinner=False)
+def _load_reportlab() -> Optional[Tuple[Any, Any, Any]]:
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.units import cm
+    except Exception:
+        return None
+    return canvas, A4, cm
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True, frozen=True)
 class SessionPlan:
     day: str
     focus: str
@@ -39,7 +70,14 @@ class SessionPlan:
     notes: str
 
 
-DAYS_ORDER = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+DAYS_ORDER = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+_DAY_INDEX = {d: i for i, d in enumerate(DAYS_ORDER)}
+
+
+def _day_sort_key(session: SessionPlan) -> int:
+    return _DAY_INDEX.get(session.day, 99)
+
 
 MEDIA_DIR = Path("media")
 
@@ -52,14 +90,172 @@ BOXING_VISUAL_MAP: Dict[str, str] = {
 }
 
 
+@st.cache_resource(show_spinner=False)
+def _visual_index() -> Tuple[Dict[str, Path], Optional["re.Pattern[str]"]]:
+    available = {
+        keyword: MEDIA_DIR / filename
+        for keyword, filename in BOXING_VISUAL_MAP.items()
+        if (MEDIA_DIR / filename).exists()
+    }
+    pattern = re.compile("|".join(map(re.escape, available))) if available else None
+    return available, pattern
+
+
+@st.cache_resource(max_entries=128, show_spinner=False)
 def find_visual_for_session(focus: str) -> Optional[Path]:
-    focus_lower = focus.lower()
-    for keyword, filename in BOXING_VISUAL_MAP.items():
-        if keyword in focus_lower:
-            candidate = MEDIA_DIR / filename
-            if candidate.exists():
-                return candidate
-    return None
+    available, pattern = _visual_index()
+    if pattern is None:
+        return None
+    match = pattern.search(focus.lower())
+    return available[match.group(0)] if match else None
+
+
+@st.cache_data(show_spinner=False)
+def _load_image_bytes(path: str) -> bytes:
+    return Path(path).read_bytes()
+
+
+_BOXING_TEMPLATES_NOVICE = (
+    (
+        "Tue",
+        "Boxing basics: stance, guard & straight punches",
+        "Easy–Moderate",
+        25,
+        30,
+        (
+            "Warm-up: 5 min skipping or brisk walk.\n"
+            "Technique: 4 × 2 min shadow boxing (jab–cross, basic guard) with 1 min rest.\n"
+            "Bag/pillow: 4 × 1 min straight punches, light power.\n"
+            "Cool-down: 5 min shoulder, wrist and calf stretches.\n"
+            "Contraindications to watch: {contra}."
+        ),
+    ),
+    (
+        "Thu",
+        "Footwork & defence foundations",
+        "Moderate",
+        25,
+        35,
+        (
+            "Warm-up: 5 min dynamic mobility (hips, ankles, shoulders).\n"
+            "Main: 4 × 2 min shadow boxing with basic steps (forward/back/side) and guard up.\n"
+            "Defence drill: 3 × 2 min slip/duck movements in front of mirror or wall.\n"
+            "Core: 3 × 20 s plank, 20 s rest.\n"
+            "Cool-down: 5 min relaxed walk + breathing.\n"
+            "Avoid any movements that aggravate: {contra}."
+        ),
+    ),
+    (
+        "Sat",
+        "Conditioning: simple intervals + technique",
+        "Moderate",
+        30,
+        40,
+        (
+            "Warm-up: 5 min skipping or light jog.\n"
+            "Intervals: 6 × 30 s fast straight punches (shadow or bag) + 60 s easy movement.\n"
+            "Technique: 4 × 2 min shadow boxing, mixing punches with basic defence.\n"
+            "Cool-down: 5–8 min stretch (hips, hamstrings, shoulders).\n"
+            "Stop if pain or dizziness occurs, especially given: {contra}."
+        ),
+    ),
+)
+
+_BOXING_TEMPLATES_INTERMEDIATE = (
+    (
+        "Mon",
+        "Technical combinations & footwork",
+        "Moderate–Hard",
+        35,
+        55,
+        (
+            "Warm-up: 5 min skipping + joint mobility.\n"
+            "Combos on bag/shadow: 5 × 3 min (jab–cross–hook, jab–cross–cross–hook), "
+            "60–90 s rest.\n"
+            "Footwork rounds: 3 × 2 min circling and cutting the ring.\n"
+            "Cool-down: 5 min light walk + stretching.\n"
+            "Modify combinations if they aggravate: {contra}."
+        ),
+    ),
+    (
+        "Wed",
+        "Defence, counters & core",
+        "Moderate",
+        35,
+        50,
+        (
+            "Warm-up: 5 min dynamic warm-up.\n"
+            "Defence rounds: 4 × 3 min slips, ducks, parries, then counter 1–2 punches.\n"
+            "Shadow or bag work: 3 × 2 min focusing on clean form at moderate pace.\n"
+            "Core circuit: 3 rounds (20 s plank, 10 sit-ups, 10 Russian twists), 60 s rest.\n"
+            "Respect pain or previous issues: {contra}."
+        ),
+    ),
+    (
+        "Fri",
+        "Conditioning: intervals & power focus",
+        "Hard",
+        35,
+        60,
+        (
+            "Warm-up: 5–7 min.\n"
+            "Intervals: 8 × 30 s high-output bag punching (all punches) + 60 s light movement.\n"
+            "Power focus: 3 × 2 min heavier single shots and 2–3 punch combinations.\n"
+            "Cool-down: 5–8 min stretching & breathing.\n"
+            "Keep technique tidy; reduce power if form breaks under fatigue."
+        ),
+    ),
+)
+
+_BOXING_TEMPLATES_ADVANCED = (
+    (
+        "Tue",
+        "High-complexity combinations & movement",
+        "Hard",
+        40,
+        70,
+        (
+            "Warm-up: 8 min mixed skipping + mobility.\n"
+            "Complex combos: 5 × 3 min on bag/pads, mixing level changes and angles.\n"
+            "Footwork intensity: 3 × 2 min high-tempo ring movement.\n"
+            "Cool-down: 5–8 min mobility & stretch.\n"
+            "Monitor joints and previous issues: {contra}."
+        ),
+    ),
+    (
+        "Thu",
+        "Defence, counters & conditioning mixed",
+        "Hard",
+        40,
+        70,
+        (
+            "Warm-up: 6–8 min.\n"
+            "Defence & counter rounds: 4 × 3 min with slips, blocks and quick counters.\n"
+            "Conditioning: 6 × 30 s punch sprints + 60 s active rest.\n"
+            "Core & stability: 3 × 30 s plank variations.\n"
+            "Cool-down as normal; adjust if any warning signs."
+        ),
+    ),
+    (
+        "Sat",
+        "Mixed technical conditioning (no full sparring)",
+        "Moderate–Hard",
+        40,
+        65,
+        (
+            "Warm-up: 6–8 min.\n"
+            "Shadow rounds: 3 × 3 min visualising an opponent.\n"
+            "Bag rounds: 4 × 3 min mixing power and volume.\n"
+            "Cool-down: 5–8 min.\n"
+            "If usually sparring, this tool deliberately avoids contact to reduce risk."
+        ),
+    ),
+)
+
+_LEVEL_DISPATCH = {
+    "novice": _BOXING_TEMPLATES_NOVICE,
+    "intermediate": _BOXING_TEMPLATES_INTERMEDIATE,
+}
 
 
 def generate_boxing_sessions_template(
@@ -67,155 +263,24 @@ def generate_boxing_sessions_template(
     sessions_per_week: int,
     contraindications: str,
 ) -> List[SessionPlan]:
-    level = level.lower()
-
-    if level == "novice":
-        templates = [
-            SessionPlan(
-                day="Tue",
-                focus="Boxing basics: stance, guard & straight punches",
-                intensity="Easy–Moderate",
-                duration_min=25,
-                load_units=30,
-                notes=(
-                    "Warm-up: 5 min skipping or brisk walk.\n"
-                    "Technique: 4 × 2 min shadow boxing (jab–cross, basic guard) with 1 min rest.\n"
-                    "Bag/pillow: 4 × 1 min straight punches, light power.\n"
-                    "Cool-down: 5 min shoulder, wrist and calf stretches.\n"
-                    f"Contraindications to watch: {contraindications or 'None stated'}."
-                )
-            ),
-            SessionPlan(
-                day="Thu",
-                focus="Footwork & defence foundations",
-                intensity="Moderate",
-                duration_min=25,
-                load_units=35,
-                notes=(
-                    "Warm-up: 5 min dynamic mobility (hips, ankles, shoulders).\n"
-                    "Main: 4 × 2 min shadow boxing with basic steps (forward/back/side) and guard up.\n"
-                    "Defence drill: 3 × 2 min slip/duck movements in front of mirror or wall.\n"
-                    "Core: 3 × 20 s plank, 20 s rest.\n"
-                    "Cool-down: 5 min relaxed walk + breathing.\n"
-                    f"Avoid any movements that aggravate: {contraindications or 'None'}."
-                )
-            ),
-            SessionPlan(
-                day="Sat",
-                focus="Conditioning: simple intervals + technique",
-                intensity="Moderate",
-                duration_min=30,
-                load_units=40,
-                notes=(
-                    "Warm-up: 5 min skipping or light jog.\n"
-                    "Intervals: 6 × 30 s fast straight punches (shadow or bag) + 60 s easy movement.\n"
-                    "Technique: 4 × 2 min shadow boxing, mixing punches with basic defence.\n"
-                    "Cool-down: 5–8 min stretch (hips, hamstrings, shoulders).\n"
-                    f"Stop if pain or dizziness occurs, especially given: {contraindications or 'no stated issues'}."
-                )
-            ),
-        ]
-    elif level == "intermediate":
-        templates = [
-            SessionPlan(
-                day="Mon",
-                focus="Technical combinations & footwork",
-                intensity="Moderate–Hard",
-                duration_min=35,
-                load_units=55,
-                notes=(
-                    "Warm-up: 5 min skipping + joint mobility.\n"
-                    "Combos on bag/shadow: 5 × 3 min (jab–cross–hook, jab–cross–cross–hook), "
-                    "60–90 s rest.\n"
-                    "Footwork rounds: 3 × 2 min circling and cutting the ring.\n"
-                    "Cool-down: 5 min light walk + stretching.\n"
-                    f"Modify combinations if they aggravate: {contraindications or 'None'}."
-                )
-            ),
-            SessionPlan(
-                day="Wed",
-                focus="Defence, counters & core",
-                intensity="Moderate",
-                duration_min=35,
-                load_units=50,
-                notes=(
-                    "Warm-up: 5 min dynamic warm-up.\n"
-                    "Defence rounds: 4 × 3 min slips, ducks, parries, then counter 1–2 punches.\n"
-                    "Shadow or bag work: 3 × 2 min focusing on clean form at moderate pace.\n"
-                    "Core circuit: 3 rounds (20 s plank, 10 sit-ups, 10 Russian twists), 60 s rest.\n"
-                    f"Respect pain or previous issues: {contraindications or 'None'}."
-                )
-            ),
-            SessionPlan(
-                day="Fri",
-                focus="Conditioning: intervals & power focus",
-                intensity="Hard",
-                duration_min=35,
-                load_units=60,
-                notes=(
-                    "Warm-up: 5–7 min.\n"
-                    "Intervals: 8 × 30 s high-output bag punching (all punches) + 60 s light movement.\n"
-                    "Power focus: 3 × 2 min heavier single shots and 2–3 punch combinations.\n"
-                    "Cool-down: 5–8 min stretching & breathing.\n"
-                    "Keep technique tidy; reduce power if form breaks under fatigue."
-                )
-            ),
-        ]
-    else:
-        templates = [
-            SessionPlan(
-                day="Tue",
-                focus="High-complexity combinations & movement",
-                intensity="Hard",
-                duration_min=40,
-                load_units=70,
-                notes=(
-                    "Warm-up: 8 min mixed skipping + mobility.\n"
-                    "Complex combos: 5 × 3 min on bag/pads, mixing level changes and angles.\n"
-                    "Footwork intensity: 3 × 2 min high-tempo ring movement.\n"
-                    "Cool-down: 5–8 min mobility & stretch.\n"
-                    f"Monitor joints and previous issues: {contraindications or 'None declared'}."
-                )
-            ),
-            SessionPlan(
-                day="Thu",
-                focus="Defence, counters & conditioning mixed",
-                intensity="Hard",
-                duration_min=40,
-                load_units=70,
-                notes=(
-                    "Warm-up: 6–8 min.\n"
-                    "Defence & counter rounds: 4 × 3 min with slips, blocks and quick counters.\n"
-                    "Conditioning: 6 × 30 s punch sprints + 60 s active rest.\n"
-                    "Core & stability: 3 × 30 s plank variations.\n"
-                    "Cool-down as normal; adjust if any warning signs."
-                )
-            ),
-            SessionPlan(
-                day="Sat",
-                focus="Mixed technical conditioning (no full sparring)",
-                intensity="Moderate–Hard",
-                duration_min=40,
-                load_units=65,
-                notes=(
-                    "Warm-up: 6–8 min.\n"
-                    "Shadow rounds: 3 × 3 min visualising an opponent.\n"
-                    "Bag rounds: 4 × 3 min mixing power and volume.\n"
-                    "Cool-down: 5–8 min.\n"
-                    "If usually sparring, this tool deliberately avoids contact to reduce risk."
-                )
-            ),
-        ]
-
-    if sessions_per_week <= len(templates):
-        sessions = templates[:sessions_per_week]
-    else:
-        sessions = templates.copy()
-        while len(sessions) < sessions_per_week:
-            sessions.append(templates[0])
+    templates = _LEVEL_DISPATCH.get(level.lower(), _BOXING_TEMPLATES_ADVANCED)
+    contra = contraindications or "None"
+
+    sessions = [
+        SessionPlan(
+            day=day,
+            focus=focus,
+            intensity=intensity,
+            duration_min=duration,
+            load_units=load,
+            notes=note_template.format(contra=contra),
+        )
+        for day, focus, intensity, duration, load, note_template in itertools.islice(
+            itertools.cycle(templates), sessions_per_week
+        )
+    ]
 
-    day_index = {d: i for i, d in enumerate(DAYS_ORDER)}
-    sessions.sort(key=lambda s: day_index.get(s.day, 99))
+    sessions.sort(key=_day_sort_key)
     return sessions
 
 
@@ -246,145 +311,252 @@ def generate_generic_sessions_template(
     return sessions
 
 
-def generate_sessions_ai(
+SYSTEM_PROMPT_SESSIONS = (
+    "You are a cautious strength and conditioning coach who avoids unnecessary risk. "
+    "Design a safe one-week training plan for a recreational athlete.\n\n"
+    "General rules:\n"
+    "- Focus on non-contact, non-maximal work.\n"
+    "- Use body-weight, light conditioning, or bag/shadow work (for boxing).\n"
+    "- No heavy barbell max testing, no dangerous plyometrics.\n"
+    "- Encourage listening to the body, stopping if anything feels sharp or worrying.\n\n"
+    "Return ONLY valid JSON with a list under key 'sessions' and a string under key "
+    "'coach_message', no extra commentary.\n"
+    "For each session, include fields:\n"
+    "- day: one of Mon, Tue, Wed, Thu, Fri, Sat, Sun\n"
+    "- focus: short description of the main aim (e.g., 'Intervals and tempo work')\n"
+    "- intensity: 'Easy', 'Moderate', or 'Hard'\n"
+    "- duration_min: integer between 20 and 60 minutes\n"
+    "- notes: outline warm-up, main part and cool-down in plain language\n\n"
+    "The coach_message is a short motivational message (120–160 words) for the week. "
+    "Keep it safe, realistic and encouraging. Highlight pacing, rest, technique quality, "
+    "and listening to the body. Avoid medical advice and do not promise specific results.\n\n"
+    "Example JSON structure:\n"
+    "{\n"
+    "  \"sessions\": [\n"
+    "    {\n"
+    "      \"day\": \"Tue\",\n"
+    "      \"focus\": \"Easy aerobic base run\",\n"
+    "      \"intensity\": \"Easy\",\n"
+    "      \"duration_min\": 30,\n"
+    "      \"notes\": \"Warm-up: ... Main: ... Cool-down: ...\"\n"
+    "    }\n"
+    "  ],\n"
+    "  \"coach_message\": \"This week is about ...\"\n"
+    "}\n\n"
+    "The athlete's details follow in the next message.\n"
+)
+
+SYSTEM_PROMPT_COACHING = (
+    "You are a calm, supportive sports coach. "
+    "Write a short motivational message (120–160 words) for this week. "
+    "Keep it safe, realistic and encouraging. Highlight pacing, rest, "
+    "technique quality, and listening to the body. Avoid medical advice "
+    "and do not promise specific results.\n\n"
+    "The week's details follow in the next message.\n"
+)
+
+SYSTEM_PROMPT_ASSISTANT = (
+    "You are an in-app coaching assistant. Answer questions about the training plan, "
+    "RPE, load, and safety in simple, friendly language. Do NOT give medical advice or "
+    "talk about internal implementation details. Do not mention any models or APIs.\n\n"
+    "RPE explanation: 1–10 scale of how hard it felt. 1 = very easy, 10 = maximum effort.\n"
+    "Load units: an internal number that combines how long and how hard sessions are. "
+    "Higher numbers mean more training stress.\n\n"
+    "The athlete's current plan follows in the next message.\n"
+)
+
+
+PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "weekly_plan",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "sessions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "day": {"type": "string", "enum": list(DAYS_ORDER)},
+                            "focus": {"type": "string"},
+                            "intensity": {
+                                "type": "string",
+                                "enum": ["Easy", "Moderate", "Hard"],
+                            },
+                            "duration_min": {"type": "integer"},
+                            "notes": {"type": "string"},
+                        },
+                        "required": ["day", "focus", "intensity", "duration_min", "notes"],
+                        "additionalProperties": False,
+                    },
+                },
+                "coach_message": {"type": "string"},
+            },
+            "required": ["sessions", "coach_message"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def _parse_json(raw: str) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
+
+def _log_prompt_cache_usage(label: str, response: Any) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    logger.info(
+        "%s: %s prompt tokens, %s served from prompt cache",
+        label,
+        usage.prompt_tokens,
+        cached,
+    )
+
+
+# Room for the ~160-word coach message plus each session's fields and notes.
+PLAN_BASE_TOKENS = 350
+PLAN_TOKENS_PER_SESSION = 150
+
+
+@st.cache_data(ttl=1800, show_spinner=False)
+def _call_openai_plan(
     sport: str,
     level: str,
     sessions_per_week: int,
     last_week_load: int,
     contraindications: str,
-) -> Optional[List[SessionPlan]]:
-    if not OPENAI_AVAILABLE:
-        return None
+) -> Dict[str, Any]:
+    level_lower = level.lower()
 
-    try:
-        level_lower = level.lower()
-
-        if last_week_load <= 0:
-            if level_lower == "novice":
-                total_minutes_target = sessions_per_week * 25
-            elif level_lower == "intermediate":
-                total_minutes_target = sessions_per_week * 35
-            else:
-                total_minutes_target = sessions_per_week * 40
+    if last_week_load <= 0:
+        if level_lower == "novice":
+            total_minutes_target = sessions_per_week * 25
+        elif level_lower == "intermediate":
+            total_minutes_target = sessions_per_week * 35
         else:
-            total_minutes_target = max(60, min(300, int(last_week_load * 0.8)))
-
-        safety_context = (
-            "General rules:\n"
-            "- Focus on non-contact, non-maximal work.\n"
-            "- Use body-weight, light conditioning, or bag/shadow work (for boxing).\n"
-            "- No heavy barbell max testing, no dangerous plyometrics.\n"
-            "- Encourage listening to the body, stopping if anything feels sharp or worrying.\n"
-        )
+            total_minutes_target = sessions_per_week * 40
+    else:
+        total_minutes_target = max(60, min(300, int(last_week_load * 0.8)))
+
+    prompt = (
+        f"Sport: {sport}\n"
+        f"Level: {level}\n"
+        f"Approximate sessions per week: {sessions_per_week}\n"
+        f"Approximate total minutes target: {total_minutes_target}\n"
+        f"Things to be careful with: {contraindications or 'None stated'}\n"
+    )
 
-        prompt = (
-            "Design a safe one-week training plan for a recreational athlete.\n"
-            "Return ONLY valid JSON with a list under key 'sessions', no extra commentary.\n\n"
-            f"Sport: {sport}\n"
-            f"Level: {level}\n"
-            f"Approximate sessions per week: {sessions_per_week}\n"
-            f"Approximate total minutes target: {total_minutes_target}\n"
-            f"Things to be careful with: {contraindications or 'None stated'}\n\n"
-            f"{safety_context}\n"
-            "For each session, include fields:\n"
-            "- day: one of Mon, Tue, Wed, Thu, Fri, Sat, Sun\n"
-            "- focus: short description of the main aim (e.g., 'Intervals and tempo work')\n"
-            "- intensity: 'Easy', 'Moderate', or 'Hard'\n"
-            "- duration_min: integer between 20 and 60 minutes\n"
-            "- notes: outline warm-up, main part and cool-down in plain language\n\n"
-            "Example JSON structure:\n"
-            "{\n"
-            "  \"sessions\": [\n"
-            "    {\n"
-            "      \"day\": \"Tue\",\n"
-            "      \"focus\": \"Easy aerobic base run\",\n"
-            "      \"intensity\": \"Easy\",\n"
-            "      \"duration_min\": 30,\n"
-            "      \"notes\": \"Warm-up: ... Main: ... Cool-down: ...\"\n"
-            "    }\n"
-            "  ]\n"
-            "}\n"
-        )
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT_SESSIONS},
+            {"role": "user", "content": prompt},
+        ],
+        max_tokens=PLAN_BASE_TOKENS + PLAN_TOKENS_PER_SESSION * sessions_per_week,
+        temperature=0.8,
+        response_format=PLAN_RESPONSE_FORMAT,
+    )
+    _log_prompt_cache_usage("plan", response)
 
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a cautious strength and conditioning coach who avoids unnecessary risk.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            max_tokens=900,
-            temperature=0.8,
-        )
+    if response.choices[0].finish_reason == "length":
+        raise ValueError("OpenAI plan response was truncated at the token limit")
 
-        raw = response.choices[0].message.content.strip()
+    data = _parse_json(response.choices[0].message.content)
+    sessions_data = data.get("sessions", [])
 
-        if raw.startswith("```"):
-            raw = raw.strip("`")
-            raw = raw.replace("json", "", 1).strip()
+    sessions: List[SessionPlan] = []
+    used_days = set()
+
+    for item in sessions_data:
+        if len(sessions) >= sessions_per_week:
+            break
+
+        day = item.get("day", "Mon")
+        if day not in DAYS_ORDER:
+            day = "Mon"
+
+        base_index = _DAY_INDEX[day]
+        for offset in range(len(DAYS_ORDER)):
+            candidate_day = DAYS_ORDER[(base_index + offset) % len(DAYS_ORDER)]
+            if candidate_day not in used_days:
+                day = candidate_day
+                used_days.add(day)
+                break
 
-        data = json.loads(raw)
-        sessions_data = data.get("sessions", [])
+        focus = item.get("focus", f"{sport} session")
+        intensity = item.get("intensity", "Moderate").title()
+        if intensity not in ["Easy", "Moderate", "Hard"]:
+            intensity = "Moderate"
 
-        sessions: List[SessionPlan] = []
-        used_days = set()
+        duration = int(item.get("duration_min", 30))
+        duration = max(20, min(60, duration))
 
-        for item in sessions_data:
-            if len(sessions) >= sessions_per_week:
-                break
+        factor = {"Easy": 1, "Moderate": 2, "Hard": 3}.get(intensity, 2)
+        load_units = factor * duration
 
-            day = item.get("day", "Mon")
-            if day not in DAYS_ORDER:
-                day = "Mon"
-
-            base_index = DAYS_ORDER.index(day)
-            for offset in range(len(DAYS_ORDER)):
-                candidate_day = DAYS_ORDER[(base_index + offset) % len(DAYS_ORDER)]
-                if candidate_day not in used_days:
-                    day = candidate_day
-                    used_days.add(day)
-                    break
-
-            focus = item.get("focus", f"{sport} session")
-            intensity = item.get("intensity", "Moderate").title()
-            if intensity not in ["Easy", "Moderate", "Hard"]:
-                intensity = "Moderate"
-
-            duration = int(item.get("duration_min", 30))
-            duration = max(20, min(60, duration))
-
-            factor = {"Easy": 1, "Moderate": 2, "Hard": 3}.get(intensity, 2)
-            load_units = factor * duration
-
-            notes = item.get("notes", "")
-            notes += (
-                f"\n\nIf anything feels sharp, unusual or worrying, stop or reduce intensity. "
-                f"Context to remember: {contraindications or 'no specific issues noted'}."
-            )
+        notes = item.get("notes", "")
+        notes += (
+            f"\n\nIf anything feels sharp, unusual or worrying, stop or reduce intensity. "
+            f"Context to remember: {contraindications or 'no specific issues noted'}."
+        )
 
-            sessions.append(
-                SessionPlan(
-                    day=day,
-                    focus=focus,
-                    intensity=intensity,
-                    duration_min=duration,
-                    load_units=load_units,
-                    notes=notes,
-                )
+        sessions.append(
+            SessionPlan(
+                day=day,
+                focus=focus,
+                intensity=intensity,
+                duration_min=duration,
+                load_units=load_units,
+                notes=notes,
             )
+        )
 
-        if not sessions:
-            return None
+    if not sessions:
+        raise ValueError("AI response contained no usable sessions.")
+
+    sessions.sort(key=_day_sort_key)
+    return {
+        "sessions": [asdict(s) for s in sessions],
+        "coach_message": str(data.get("coach_message") or "").strip(),
+    }
 
-        day_index = {d: i for i, d in enumerate(DAYS_ORDER)}
-        sessions.sort(key=lambda s: day_index.get(s.day, 99))
-        return sessions
 
+def generate_plan_ai(
+    sport: str,
+    level: str,
+    sessions_per_week: int,
+    last_week_load: int,
+    contraindications: str,
+) -> Optional[Tuple[List[SessionPlan], str]]:
+    if get_openai_client() is None:
+        return None
+
+    # Failures raise inside the cached call so they are never memoized.
+    try:
+        plan = _call_openai_plan(
+            sport=sport,
+            level=level,
+            sessions_per_week=sessions_per_week,
+            last_week_load=last_week_load,
+            contraindications=contraindications,
+        )
     except Exception:
+        logger.warning("AI plan generation failed; using the template plan", exc_info=True)
         return None
 
+    return [SessionPlan(**d) for d in plan["sessions"]], plan["coach_message"]
+
 
 def apply_weekly_load_guardrail(
     sessions: List[SessionPlan],
@@ -397,33 +569,96 @@ def apply_weekly_load_guardrail(
     allowed_max = max(int(last_week_load * 1.10), last_week_load + 20)
 
     if current_total <= allowed_max:
-        sessions[0].notes += (
+        load_check = (
             f"\n\nLoad check: planned weekly load {current_total} vs "
             f"last week {last_week_load} (within approximately +10% rule)."
         )
-        return sessions
+        return [replace(sessions[0], notes=sessions[0].notes + load_check), *sessions[1:]]
 
     factor = allowed_max / current_total
-    for s in sessions:
-        s.load_units = max(20, int(s.load_units * factor))
-        s.notes += (
-            f"\n\nLoad guardrail applied: weekly load reduced to stay within "
-            f"+10% of last week ({last_week_load} → target ≤ {allowed_max})."
+    suffix = (
+        f"\n\nLoad guardrail applied: weekly load reduced to stay within "
+        f"+10% of last week ({last_week_load} → target ≤ {allowed_max})."
+    )
+    return [
+        replace(
+            s,
+            load_units=max(20, int(s.load_units * factor)),
+            notes=s.notes + suffix,
         )
+        for s in sessions
+    ]
 
-    return sessions
+
+COACH_STREAM_FLUSH_S = 0.1
+
+COACHING_FALLBACK = (
+    "This week is about consistent, safe work. Focus on clean technique, "
+    "controlled breathing, and honest pacing. If anything feels sharp, "
+    "unusual or worrying, ease back or rest instead of forcing it. "
+    "Small, steady sessions will build confidence and fitness over time."
+)
+
+
+def generate_coaching_message(
+    sessions: List[SessionPlan],
+    sport: str,
+    level: str,
+    use_ai: bool = True,
+) -> Iterator[str]:
+    client = get_openai_client() if use_ai else None
+    if client is None:
+        yield COACHING_FALLBACK
+        return
+
+    produced = False
+    try:
+        session_summary = "; ".join(
+            f"{s.day}: {s.focus} ({s.intensity}, {s.duration_min} min)"
+            for s in sessions
+        )
+        prompt = (
+            f"Sport: {sport}\n"
+            f"Level: {level}\n"
+            f"Weekly minutes: {sum(s.duration_min for s in sessions)}\n"
+            f"Weekly load units: {sum(s.load_units for s in sessions)}\n"
+            f"Sessions: {session_summary}\n"
+        )
+
+        stream = client.chat.completions.create(
+            model="gpt-4.1-mini",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT_COACHING},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=220,
+            temperature=0.8,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                _log_prompt_cache_usage("coaching message", chunk)
+                continue
+            fragment = chunk.choices[0].delta.content
+            if fragment:
+                produced = True
+                yield fragment
+    except Exception:
+        pass
+
+    if not produced:
+        yield COACHING_FALLBACK
 
 
-def generate_week_plan(
+def generate_plan_and_message(
     sport: str,
     level: str,
     sessions_per_week: int,
     last_week_load: int,
     contraindications: str,
-) -> List[SessionPlan]:
-    sport_lower = sport.lower()
-
-    ai_sessions = generate_sessions_ai(
+) -> Tuple[List[SessionPlan], str]:
+    ai_plan = generate_plan_ai(
         sport=sport,
         level=level,
         sessions_per_week=sessions_per_week,
@@ -431,10 +666,11 @@ def generate_week_plan(
         contraindications=contraindications,
     )
 
-    if ai_sessions:
-        sessions = ai_sessions
+    if ai_plan:
+        sessions, coach_text = ai_plan
     else:
-        if sport_lower == "boxing":
+        coach_text = ""
+        if sport.lower() == "boxing":
             sessions = generate_boxing_sessions_template(
                 level=level,
                 sessions_per_week=sessions_per_week,
@@ -449,87 +685,57 @@ def generate_week_plan(
             )
 
     sessions = apply_weekly_load_guardrail(sessions, last_week_load)
-    return sessions
+    return sessions, coach_text
 
 
-def generate_coaching_message(
-    sessions: List[SessionPlan],
-    sport: str,
-    level: str,
-    use_ai: bool = True,
-) -> str:
-    fallback = (
-        "This week is about consistent, safe work. Focus on clean technique, "
-        "controlled breathing, and honest pacing. If anything feels sharp, "
-        "unusual or worrying, ease back or rest instead of forcing it. "
-        "Small, steady sessions will build confidence and fitness over time."
-    )
+@st.cache_data(ttl=86400, max_entries=64, show_spinner=False)
+def _call_openai_speech(text: str, voice: str) -> bytes:
+    buffer = io.BytesIO()
+    with get_openai_client().audio.speech.with_streaming_response.create(
+        model="gpt-4o-mini-tts",
+        voice=voice,
+        input=text,
+    ) as response:
+        for chunk in response.iter_bytes():
+            buffer.write(chunk)
+    audio = buffer.getvalue()
+    if not audio:
+        raise ValueError("Speech response contained no audio.")
+    return audio
 
-    if not use_ai or not OPENAI_AVAILABLE:
-        return fallback
 
-    try:
-        total_load = sum(s.load_units for s in sessions)
-        total_minutes = sum(s.duration_min for s in sessions)
-        session_summary = "; ".join(
-            f"{s.day}: {s.focus} ({s.intensity}, {s.duration_min} min)"
-            for s in sessions
-        )
+AUDIO_CACHE_SIZE = 8
 
-        prompt = (
-            "You are a calm, supportive sports coach. "
-            "Write a short motivational message (120–160 words) for this week. "
-            "Keep it safe, realistic and encouraging. Highlight pacing, rest, "
-            "technique quality, and listening to the body. Avoid medical advice "
-            "and do not promise specific results.\n\n"
-            f"Sport: {sport}\n"
-            f"Level: {level}\n"
-            f"Weekly minutes: {total_minutes}\n"
-            f"Weekly load units: {total_load}\n"
-            f"Sessions: {session_summary}\n"
-        )
+AUDIO_POLL_S = 0.5
 
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "You are a safe, encouraging sports coach."},
-                {"role": "user", "content": prompt},
-            ],
-            max_tokens=220,
-            temperature=0.8,
-        )
-        text = response.choices[0].message.content.strip()
-        return text or fallback
-    except Exception:
-        return fallback
+
+@st.cache_resource
+def _tts_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=2)
 
 
-def generate_voice_for_message(text: str) -> Optional[bytes]:
-    if not OPENAI_AVAILABLE:
+def generate_voice_for_message(text: str, voice: str = "alloy") -> Optional[bytes]:
+    if get_openai_client() is None:
         return None
 
     try:
-        response = client.audio.speech.create(
-            model="gpt-4o-mini-tts",
-            voice="alloy",
-            input=text,
-        )
-        if hasattr(response, "read"):
-            return response.read()
-        if hasattr(response, "to_bytes"):
-            return response.to_bytes()
-        return None
+        return _call_openai_speech(text, voice)
     except Exception:
         return None
 
 
+_COACH_WRAPPER = textwrap.TextWrapper(width=90, break_long_words=False)
+
+
 def build_plan_pdf(
     sessions: List[SessionPlan],
     meta: Dict[str, Any],
     coach_text: str,
-) -> Optional[bytes]:
-    if not PDF_AVAILABLE:
+) -> Optional[io.BytesIO]:
+    reportlab = _load_reportlab()
+    if reportlab is None:
         return None
+    canvas, A4, cm = reportlab
 
     buffer = io.BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
@@ -551,29 +757,22 @@ def build_plan_pdf(
     c.drawString(x_margin, y, f"Last week's load (units): {last_load}")
     y -= 1 * cm
 
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(x_margin, y, "Day")
-    c.drawString(x_margin + 2.5 * cm, y, "Focus")
-    c.drawString(x_margin + 10 * cm, y, "Dur (min)")
-    c.drawString(x_margin + 13 * cm, y, "Load")
-    y -= 0.4 * cm
-    c.line(x_margin, y, width - x_margin, y)
-    y -= 0.3 * cm
+    def _draw_header(y: float) -> float:
+        c.setFont("Helvetica-Bold", 11)
+        c.drawString(x_margin, y, "Day")
+        c.drawString(x_margin + 2.5 * cm, y, "Focus")
+        c.drawString(x_margin + 10 * cm, y, "Dur (min)")
+        c.drawString(x_margin + 13 * cm, y, "Load")
+        y -= 0.4 * cm
+        c.line(x_margin, y, width - x_margin, y)
+        c.setFont("Helvetica", 10)
+        return y - 0.3 * cm
 
-    c.setFont("Helvetica", 10)
+    y = _draw_header(y)
     for s in sessions:
         if y < 3 * cm:
             c.showPage()
-            y = height - 2 * cm
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(x_margin, y, "Day")
-            c.drawString(x_margin + 2.5 * cm, y, "Focus")
-            c.drawString(x_margin + 10 * cm, y, "Dur (min)")
-            c.drawString(x_margin + 13 * cm, y, "Load")
-            y -= 0.4 * cm
-            c.line(x_margin, y, width - x_margin, y)
-            y -= 0.3 * cm
-            c.setFont("Helvetica", 10)
+            y = _draw_header(height - 2 * cm)
 
         c.drawString(x_margin, y, s.day)
         c.drawString(x_margin + 2.5 * cm, y, s.focus[:40])
@@ -590,8 +789,7 @@ def build_plan_pdf(
     y -= 0.8 * cm
     c.setFont("Helvetica", 10)
 
-    from textwrap import wrap
-    for line in wrap(coach_text, 90):
+    for line in _COACH_WRAPPER.wrap(coach_text):
         if y < 2 * cm:
             c.showPage()
             y = height - 2 * cm
@@ -601,27 +799,58 @@ def build_plan_pdf(
 
     c.showPage()
     c.save()
-    pdf = buffer.getvalue()
-    buffer.close()
-    return pdf
+    buffer.seek(0)
+    return buffer
+
+
+def _plan_pdf_download(
+    sessions: List[SessionPlan],
+    meta: Dict[str, Any],
+    coach_text: str,
+) -> io.BytesIO:
+    buffer = build_plan_pdf(sessions, meta, coach_text)
+    if buffer is None:
+        raise RuntimeError("reportlab is installed but could not be imported.")
+    return buffer
+
+
+@st.cache_data(show_spinner=False)
+def build_plan_dataframe(plan_sessions: Tuple[Dict[str, Any], ...]) -> "pd.DataFrame":
+    import pandas as pd
+
+    count = len(plan_sessions)
+    return pd.DataFrame(
+        {
+            "Day": [s["day"] for s in plan_sessions],
+            "Focus": [s["focus"] for s in plan_sessions],
+            "Intensity": [s["intensity"] for s in plan_sessions],
+            "Duration (min)": np.fromiter(
+                (s["duration_min"] for s in plan_sessions), dtype=np.int16, count=count
+            ),
+            "Load (units)": np.fromiter(
+                (s["load_units"] for s in plan_sessions), dtype=np.int16, count=count
+            ),
+        }
+    )
 
 
 def analyse_adherence_and_rpe(
-    adherence_data: List[Dict[str, Any]],
+    completed: np.ndarray,
+    rpes: np.ndarray,
 ) -> Optional[str]:
-    if not adherence_data:
+    total = len(completed)
+    if not total:
         return None
 
-    completed = [d for d in adherence_data if d.get("completed")]
-    total = len(adherence_data)
-    comp_rate = len(completed) / total if total else 0.0
+    completed_count = int(completed.sum())
+    comp_rate = float(completed.mean())
 
-    rpes = [d["rpe"] for d in completed if isinstance(d.get("rpe"), int)]
-    avg_rpe = sum(rpes) / len(rpes) if rpes else None
+    rated = (rpes >= 0) & completed
+    avg_rpe = float(rpes[rated].mean()) if rated.any() else None
 
     msg_parts = []
     msg_parts.append(
-        f"You completed {len(completed)} of {total} sessions "
+        f"You completed {completed_count} of {total} sessions "
         f"({comp_rate * 100:.0f}% adherence)."
     )
 
@@ -646,68 +875,94 @@ def analyse_adherence_and_rpe(
     return " ".join(msg_parts)
 
 
+_FAQ_RE = re.compile(r"rpe|effort|load|safe|injury", re.I)
+
+_FAQ_RPE_ANSWER = (
+    "RPE stands for Rate of Perceived Exertion, from 1 (very easy) to 10 (maximum effort). "
+    "Choose the number that best matches how hard the session felt overall."
+)
+_FAQ_SAFETY_ANSWER = (
+    "The tool keeps sessions between about 20–60 minutes and limits weekly increases in load. "
+    "It is still important to listen to your body and stop if anything feels sharp or worrying."
+)
+_FAQ_ANSWERS = {
+    "rpe": _FAQ_RPE_ANSWER,
+    "effort": _FAQ_RPE_ANSWER,
+    "load": (
+        "Unit load combines how long and how hard you worked. Roughly: "
+        "longer sessions and harder efforts mean higher load. It helps keep weekly increases safe."
+    ),
+    "safe": _FAQ_SAFETY_ANSWER,
+    "injury": _FAQ_SAFETY_ANSWER,
+}
+_FAQ_DEFAULT_ANSWER = (
+    "This coach focuses on safe training structure: sessions, effort, and weekly progression. "
+    "It cannot give medical advice. You can ask about RPE, load, why rest days appear, "
+    "or how to think about progression."
+)
+
+
+_QNORM = re.compile(r"[^\w\s]")
+
+
+def _norm(question: str) -> str:
+    return " ".join(_QNORM.sub("", question.lower()).split())
+
+
+# question_key is the normalised cache key; _question (unhashed) is what the user typed.
+@st.cache_data(ttl=604800, max_entries=256, show_spinner=False)
+def _answer_cached(
+    question_key: str,
+    sport: str,
+    level: str,
+    session_text: str,
+    _question: str,
+) -> str:
+    context = (
+        f"Current sport: {sport}\n"
+        f"Level: {level}\n"
+        f"Sessions: {session_text}\n"
+    )
+
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT_ASSISTANT},
+            {"role": "system", "content": context},
+            {"role": "user", "content": _question},
+        ],
+        max_tokens=250,
+        temperature=0.7,
+    )
+    _log_prompt_cache_usage("coach question", response)
+    return response.choices[0].message.content.strip()
+
+
 def answer_user_question(question: str) -> str:
-    if not question or question.strip() == "":
+    question_key = _norm(question or "")
+    if not question_key:
         return "Please type a question about your plan, training load, RPE, or safety."
 
     plan_sessions = st.session_state.get("plan_sessions") or []
     sport = st.session_state.get("plan_meta", {}).get("sport", "Not set")
     level = st.session_state.get("plan_meta", {}).get("level", "Not set")
 
-    if not OPENAI_AVAILABLE:
-        q_lower = question.lower()
-        if "rpe" in q_lower or "effort" in q_lower:
-            return (
-                "RPE stands for Rate of Perceived Exertion, from 1 (very easy) to 10 (maximum effort). "
-                "Choose the number that best matches how hard the session felt overall."
-            )
-        if "load" in q_lower:
-            return (
-                "Unit load combines how long and how hard you worked. Roughly: "
-                "longer sessions and harder efforts mean higher load. It helps keep weekly increases safe."
-            )
-        if "safe" in q_lower or "injury" in q_lower:
-            return (
-                "The tool keeps sessions between about 20–60 minutes and limits weekly increases in load. "
-                "It is still important to listen to your body and stop if anything feels sharp or worrying."
-            )
-        return (
-            "This coach focuses on safe training structure: sessions, effort, and weekly progression. "
-            "It cannot give medical advice. You can ask about RPE, load, why rest days appear, "
-            "or how to think about progression."
+    if get_openai_client() is None:
+        found = {m.lower() for m in _FAQ_RE.findall(question)}
+        # _FAQ_ANSWERS is in precedence order: rpe/effort, then load, then safety.
+        return next(
+            (answer for keyword, answer in _FAQ_ANSWERS.items() if keyword in found),
+            _FAQ_DEFAULT_ANSWER,
         )
 
     try:
-        session_summaries = []
-        for s in plan_sessions:
-            session_summaries.append(
-                f"{s.get('day')}: {s.get('focus')} "
-                f"({s.get('intensity')}, {s.get('duration_min')} min)"
-            )
-        session_text = "; ".join(session_summaries) if session_summaries else "No plan generated yet."
+        session_text = "; ".join(
+            f"{s.get('day')}: {s.get('focus')} "
+            f"({s.get('intensity')}, {s.get('duration_min')} min)"
+            for s in plan_sessions
+        ) or "No plan generated yet."
 
-        context = (
-            "You are an in-app coaching assistant. Answer questions about the training plan, "
-            "RPE, load, and safety in simple, friendly language. Do NOT give medical advice or "
-            "talk about internal implementation details. Do not mention any models or APIs.\n\n"
-            f"Current sport: {sport}\n"
-            f"Level: {level}\n"
-            f"Sessions: {session_text}\n\n"
-            "RPE explanation: 1–10 scale of how hard it felt. 1 = very easy, 10 = maximum effort.\n"
-            "Load units: an internal number that combines how long and how hard sessions are. "
-            "Higher numbers mean more training stress.\n"
-        )
-
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": context},
-                {"role": "user", "content": question},
-            ],
-            max_tokens=250,
-            temperature=0.7,
-        )
-        return response.choices[0].message.content.strip()
+        return _answer_cached(question_key, sport, level, session_text, question.strip())
     except Exception:
         return (
             "There was a problem generating a detailed answer. "
@@ -716,6 +971,161 @@ def answer_user_question(question: str) -> str:
         )
 
 
+NOTES_PREVIEW_CHARS = 800
+
+_SESSION_TMPL = (
+    "### {day} – {focus}\n\n"
+    "**Intensity:** {intensity}  |  "
+    "**Duration:** {duration_min} min  |  "
+    "**Load:** {load_units} units\n\n"
+    "**What to do:**\n\n{notes}"
+)
+
+
+# Dedupes conversions within a single run (long_notes and _notes_preview both call
+# it). Streamlit re-executes this module per rerun, so the cache does not outlive it.
+@lru_cache(maxsize=256)
+def _mdize(s: str) -> str:
+    return s.replace("\n", "  \n")
+
+
+def _notes_preview(notes: str) -> str:
+    text = _mdize(notes)
+    if len(text) <= NOTES_PREVIEW_CHARS:
+        return text
+    return text[:NOTES_PREVIEW_CHARS] + "…"
+
+
+_EFFORT_HTML = (
+    "<p><strong>Rate of Perceived Exertion (RPE)</strong></p>"
+    "<ul>"
+    "<li>RPE is how hard the session felt on a scale from 1 to 10.</li>"
+    "<li>1 = very easy, like a gentle walk.</li>"
+    "<li>5–6 = steady but comfortable work.</li>"
+    "<li>9–10 = maximum effort; not sustainable for long.</li>"
+    "</ul>"
+    "<p><strong>Unit Load</strong></p>"
+    "<ul>"
+    "<li>Unit load is a rough measure of training stress.</li>"
+    "<li>It combines how long you trained and how hard it felt.</li>"
+    "<li>Roughly: longer sessions and harder efforts = higher load.</li>"
+    "<li>This helps keep weekly increases safe and controlled.</li>"
+    "</ul>"
+)
+
+_SAFETY_HTML = (
+    "<ul>"
+    "<li>Sessions are kept between <strong>20 and 60 minutes</strong>.</li>"
+    "<li>Weekly load is constrained to approximately <strong>+10% of last week</strong> "
+    "when previous load is provided.</li>"
+    "<li>Notes remind the user to stop if anything feels sharp, unusual or worrying.</li>"
+    "<li>Content avoids max lifting and high-risk activities by design.</li>"
+    "<li>Always listen to your body and seek professional advice for pain or health concerns.</li>"
+    "</ul>"
+)
+
+_STATIC_HELP = (
+    "<details><summary>How effort and load are measured</summary>"
+    + _EFFORT_HTML
+    + "</details>"
+    "<details><summary>Safety summary</summary>"
+    + _SAFETY_HTML
+    + "</details>"
+)
+
+
+# Polls the background TTS job without blocking the script thread; once the
+# job is done a full rerun collects the audio and stops the polling.
+@st.fragment(run_every=AUDIO_POLL_S)
+def _coach_audio_fragment() -> None:
+    if st.session_state["tts_future"].done():
+        st.rerun()
+    st.caption("Generating audio…")
+
+
+@st.fragment
+def _session_details_fragment(sessions: List[SessionPlan]) -> None:
+    long_notes = [s for s in sessions if len(_mdize(s.notes)) > NOTES_PREVIEW_CHARS]
+    blocks = [
+        _SESSION_TMPL.format(
+            day=s.day,
+            focus=s.focus,
+            intensity=s.intensity,
+            duration_min=s.duration_min,
+            load_units=s.load_units,
+            notes=_notes_preview(s.notes),
+        )
+        for s in sessions
+    ]
+    st.markdown("\n\n---\n\n".join(blocks))
+
+    for s in long_notes:
+        with st.expander(f"Show full instructions: {s.day} – {s.focus}"):
+            st.markdown(_mdize(s.notes))
+
+    is_boxing = st.session_state["plan_meta"].get("sport", "").lower() == "boxing"
+    visuals = (
+        {s.focus: find_visual_for_session(s.focus) for s in sessions}
+        if is_boxing
+        else {}
+    )
+    for focus, visual in visuals.items():
+        if visual is not None and st.toggle(f"Show drill for {focus}", key=f"drill_{focus}"):
+            st.image(
+                _load_image_bytes(str(visual)),
+                caption=f"Example drill for {focus}",
+                width=320,
+            )
+
+
+@st.fragment
+def _adherence_fragment(sessions: List[SessionPlan]) -> None:
+    import pandas as pd
+
+    adherence_df = pd.DataFrame(
+        {
+            "Day": [s.day for s in sessions],
+            "Focus": [s.focus for s in sessions],
+            "Completed": [False] * len(sessions),
+            "RPE": [0] * len(sessions),
+        }
+    )
+
+    with st.form("adherence_form", clear_on_submit=False):
+        edited = st.data_editor(
+            adherence_df,
+            column_config={
+                "Completed": st.column_config.CheckboxColumn("Completed"),
+                "RPE": st.column_config.NumberColumn(
+                    "RPE (0–10)",
+                    min_value=0,
+                    max_value=10,
+                    step=1,
+                    help="Rate of Perceived Exertion: how hard it felt overall.",
+                ),
+            },
+            disabled=["Day", "Focus"],
+            hide_index=True,
+            width="stretch",
+            key=f"adherence_editor_{st.session_state['plan_version']}",
+        )
+        completed = edited["Completed"].to_numpy(dtype=bool)
+        rpes = edited["RPE"].fillna(-1).to_numpy(dtype=np.int8)
+
+        submitted = st.form_submit_button("Summarise adherence & effort")
+
+    if submitted:
+        adh_key = hash((completed.tobytes(), rpes.tobytes()))
+        if st.session_state.get("_adh_key") != adh_key:
+            st.session_state["_adh_summary"] = analyse_adherence_and_rpe(completed, rpes)
+            st.session_state["_adh_key"] = adh_key
+        summary = st.session_state["_adh_summary"]
+        if summary:
+            st.success(summary)
+        else:
+            st.info("No adherence data entered yet.")
+
+
 st.set_page_config(
     page_title="Rules-Constrained AI Training Aid",
     layout="wide",
@@ -725,6 +1135,10 @@ if "plan_sessions" not in st.session_state:
     st.session_state["plan_sessions"] = None
 if "plan_meta" not in st.session_state:
     st.session_state["plan_meta"] = {}
+if "coach_text" not in st.session_state:
+    st.session_state["coach_text"] = ""
+if "plan_version" not in st.session_state:
+    st.session_state["plan_version"] = None
 
 st.title("Rules-Constrained AI Training Aid with Motivational Coach")
 
@@ -785,10 +1199,23 @@ with st.sidebar:
 
 
 generate_clicked = st.button("Generate / Regenerate weekly plan", type="primary")
+force_clicked = st.button(
+    "Force regenerate",
+    help="Ignore previously cached results and request a fresh plan and message.",
+)
+
+if force_clicked:
+    _call_openai_plan.clear(
+        sport=sport,
+        level=level,
+        sessions_per_week=sessions_per_week,
+        last_week_load=last_week_load,
+        contraindications=contraindications,
+    )
 
-if generate_clicked:
+if generate_clicked or force_clicked:
     with st.spinner("Generating your personalised plan…"):
-        sessions = generate_week_plan(
+        sessions, coach_text = generate_plan_and_message(
             sport=sport,
             level=level,
             sessions_per_week=sessions_per_week,
@@ -796,7 +1223,9 @@ if generate_clicked:
             contraindications=contraindications,
         )
 
-    st.session_state["plan_sessions"] = [s.__dict__ for s in sessions]
+    st.session_state["plan_sessions"] = [asdict(s) for s in sessions]
+    st.session_state["coach_text"] = coach_text
+    st.session_state["plan_version"] = uuid4().hex
     st.session_state["plan_meta"] = {
         "sport": sport,
         "level": level,
@@ -807,21 +1236,10 @@ if generate_clicked:
 if st.session_state["plan_sessions"] is not None:
     sessions = [SessionPlan(**d) for d in st.session_state["plan_sessions"]]
 
-    df = pd.DataFrame(
-        [
-            {
-                "Day": s.day,
-                "Focus": s.focus,
-                "Intensity": s.intensity,
-                "Duration (min)": s.duration_min,
-                "Load (units)": s.load_units,
-            }
-            for s in sessions
-        ]
-    )
+    df = build_plan_dataframe(tuple(st.session_state["plan_sessions"]))
 
-    total_minutes = sum(s.duration_min for s in sessions)
-    total_load = sum(s.load_units for s in sessions)
+    total_minutes = int(df["Duration (min)"].sum())
+    total_load = int(df["Load (units)"].sum())
 
     st.subheader("Weekly Plan Overview")
     st.dataframe(df, width="stretch")
@@ -831,86 +1249,71 @@ if st.session_state["plan_sessions"] is not None:
     c2.metric("Total planned minutes", total_minutes)
     c3.metric("Total load (units)", total_load)
 
-    with c4:
-        if PDF_AVAILABLE:
-            temp_coach_text = generate_coaching_message(
-                sessions=sessions,
-                sport=st.session_state["plan_meta"].get("sport", "Not set"),
-                level=st.session_state["plan_meta"].get("level", "Not set"),
-                use_ai=True,
-            )
-            pdf_bytes = build_plan_pdf(
-                sessions,
-                st.session_state["plan_meta"],
-                temp_coach_text,
-            )
-            if pdf_bytes:
-                st.download_button(
-                    label="Download plan as PDF",
-                    data=pdf_bytes,
-                    file_name="training_plan.pdf",
-                    mime="application/pdf",
-                )
-        else:
-            st.caption("Install `reportlab` to enable PDF export.")
-
-    with st.expander("How effort and load are measured"):
-        st.markdown(
-            "**Rate of Perceived Exertion (RPE)**\n\n"
-            "- RPE is how hard the session felt on a scale from 1 to 10.\n"
-            "- 1 = very easy, like a gentle walk.\n"
-            "- 5–6 = steady but comfortable work.\n"
-            "- 9–10 = maximum effort; not sustainable for long.\n\n"
-            "**Unit Load**\n\n"
-            "- Unit load is a rough measure of training stress.\n"
-            "- It combines how long you trained and how hard it felt.\n"
-            "- Roughly: longer sessions and harder efforts = higher load.\n"
-            "- This helps keep weekly increases safe and controlled."
-        )
+    pdf_slot = c4.empty()
 
-    with st.expander("Safety summary"):
-        st.markdown(
-            "- Sessions are kept between **20 and 60 minutes**.\n"
-            "- Weekly load is constrained to approximately **+10% of last week** when previous load is provided.\n"
-            "- Notes remind the user to stop if anything feels sharp, unusual or worrying.\n"
-            "- Content avoids max lifting and high-risk activities by design.\n"
-            "- Always listen to your body and seek professional advice for pain or health concerns."
-        )
+    st.html(_STATIC_HELP)
 
     st.subheader("Motivational Coach Message")
-    coach_text = generate_coaching_message(
-        sessions=sessions,
-        sport=st.session_state["plan_meta"].get("sport", "Not set"),
-        level=st.session_state["plan_meta"].get("level", "Not set"),
-        use_ai=True,
-    )
-    st.write(coach_text)
-
-    audio_bytes = generate_voice_for_message(coach_text)
-    if audio_bytes:
-        st.audio(audio_bytes, format="audio/mp3")
-
-    with st.expander("Session details"):
-        for s in sessions:
-            st.markdown(f"### {s.day} – {s.focus}")
-            st.markdown(
-                f"**Intensity:** {s.intensity}  |  "
-                f"**Duration:** {s.duration_min} min  |  "
-                f"**Load:** {s.load_units} units"
+    if st.session_state["coach_text"]:
+        st.write(st.session_state["coach_text"])
+    else:
+        coach_slot = st.empty()
+        parts: List[str] = []
+        last_flush = time.monotonic()
+        for chunk in generate_coaching_message(
+            sessions=sessions,
+            sport=st.session_state["plan_meta"].get("sport", "Not set"),
+            level=st.session_state["plan_meta"].get("level", "Not set"),
+            use_ai=True,
+        ):
+            parts.append(chunk)
+            now = time.monotonic()
+            if now - last_flush > COACH_STREAM_FLUSH_S:
+                coach_slot.markdown("".join(parts))
+                last_flush = now
+        st.session_state["coach_text"] = "".join(parts)
+        coach_slot.markdown(st.session_state["coach_text"])
+    coach_text = st.session_state["coach_text"]
+
+    if PDF_AVAILABLE:
+        pdf_slot.download_button(
+            label="Download plan as PDF",
+            data=partial(
+                _plan_pdf_download,
+                sessions,
+                dict(st.session_state["plan_meta"]),
+                coach_text,
+            ),
+            file_name="training_plan.pdf",
+            mime="application/pdf",
+        )
+    else:
+        pdf_slot.caption("Install `reportlab` to enable PDF export.")
+
+    audio_key = hashlib.blake2b(coach_text.encode(), digest_size=16).hexdigest()
+    audio_cache = st.session_state.setdefault("_audio_cache", OrderedDict())
+    if audio_key in audio_cache:
+        audio_cache.move_to_end(audio_key)
+        st.audio(audio_cache[audio_key], format="audio/mp3")
+    elif get_openai_client() is not None:
+        # One synthesis attempt per plan version; failures are not cached.
+        tts_job = (st.session_state["plan_version"], audio_key)
+        if st.session_state.get("tts_job") != tts_job:
+            st.session_state["tts_job"] = tts_job
+            st.session_state["tts_future"] = _tts_pool().submit(
+                generate_voice_for_message, coach_text
             )
-            st.markdown("**What to do:**")
-            st.markdown(s.notes.replace("\n", "  \n"))
-
-            if st.session_state["plan_meta"].get("sport", "").lower() == "boxing":
-                visual = find_visual_for_session(s.focus)
-                if visual is not None:
-                    st.image(
-                        str(visual),
-                        caption=f"Example drill for {s.focus}",
-                        width="content",
-                    )
-
-            st.markdown("---")
+        tts_future = st.session_state["tts_future"]
+        if not tts_future.done():
+            _coach_audio_fragment()
+        elif tts_future.result():
+            audio_cache[audio_key] = tts_future.result()
+            while len(audio_cache) > AUDIO_CACHE_SIZE:
+                audio_cache.popitem(last=False)
+            st.audio(audio_cache[audio_key], format="audio/mp3")
+
+    if st.toggle("Show session details", key="show_session_details"):
+        _session_details_fragment(sessions)
 
     st.subheader("Adherence & Effort (optional reflection)")
     st.markdown(
@@ -920,41 +1323,6 @@ if st.session_state["plan_sessions"] is not None:
         "**RPE:** 1 = very easy, 10 = maximum effort."
     )
 
-    for i in range(len(sessions)):
-        if f"completed_{i}" not in st.session_state:
-            st.session_state[f"completed_{i}"] = False
-        if f"rpe_{i}" not in st.session_state:
-            st.session_state[f"rpe_{i}"] = 0
-
-    with st.form("adherence_form", clear_on_submit=False):
-        adherence_data: List[Dict[str, Any]] = []
-
-        for i, s in enumerate(sessions):
-            cols = st.columns([2, 1, 1])
-            with cols[0]:
-                st.markdown(f"**{s.day} – {s.focus}**")
-            with cols[1]:
-                done = st.checkbox(
-                    "Completed",
-                    key=f"completed_{i}",
-                )
-            with cols[2]:
-                rpe = st.number_input(
-                    "RPE (0–10)",
-                    min_value=0,
-                    max_value=10,
-                    key=f"rpe_{i}",
-                    help="Rate of Perceived Exertion: how hard it felt overall.",
-                )
-            adherence_data.append({"completed": done, "rpe": rpe})
-
-        submitted = st.form_submit_button("Summarise adherence & effort")
-
-    if submitted:
-        summary = analyse_adherence_and_rpe(adherence_data)
-        if summary:
-            st.success(summary)
-        else:
-            st.info("No adherence data entered yet.")
+    _adherence_fragment(sessions)
 else:
     st.info("Set your details on the left, then click **Generate / Regenerate weekly plan**.")